@@ -4,6 +4,7 @@
 """
 
 import os
+import re
 import sys
 import shutil
 from pathlib import Path
@@ -12,6 +13,7 @@ import click
 from loguru import logger
 
 from micro_gen.core.templates.template_loader import TemplateLoader
+from micro_gen.core.utils import GoConfigPatcher, GoRouterPatcher
 
 
 def main():
@@ -252,16 +254,19 @@ class ProjectEnhancer:
         enhancer.add_module([
             "internal/entity",
             "internal/usecase/event",
-            "pkg/event"
+            "pkg/event",
+            "pkg/natsx"
         ], [
             ("internal/entity/event.go", "entity_event.go.tmpl"),
             ("internal/usecase/event/bus.go", "event_bus.go.tmpl"),
             ("internal/usecase/event/snapshot.go", "event_snapshot.go.tmpl"),
             ("internal/usecase/event/store.go", "event_store.go.tmpl"),
+            ("pkg/event/event_registry.go", "event_registry.go.tmpl"),
             ("pkg/event/jetstream_store.go", "jetstream_store.go.tmpl"),
             ("pkg/event/jetstream_bus.go", "jetstream_bus.go.tmpl"),
             ("pkg/event/snapshot_store.go", "snapshot_store.go.tmpl"),
-            ("pkg/event/example_usage.go", "example_usage.go.tmpl")
+            ("pkg/event/example_usage.go", "example_usage.go.tmpl"),
+            ("pkg/natsx/natsx.go", "natsx.go.tmpl")
         ])
         
         enhancer.update_config({
@@ -270,6 +275,13 @@ class ProjectEnhancer:
             "ClusterName": "getEnv(\"NATS_CLUSTER_NAME\", \"micro-services\")"
         })
         
+        # 服务退出时优雅关闭共享的NATS连接
+        enhancer.update_main(["pkg/natsx"], [
+            "if err := natsx.Drain(ctx); err != nil {",
+            "\tlog.Error(\"关闭NATS连接失败\", \"error\", err)",
+            "}"
+        ])
+        
         logger.success("✅ ES事件机制添加完成！")
         self._print_next_steps([
             "go get github.com/nats-io/nats.go",
@@ -289,22 +301,59 @@ class ProjectEnhancer:
             ("internal/entity/session.go", "entity_session.go.tmpl"),
             ("internal/usecase/session/service.go", "usecase_session.go.tmpl"),
             ("pkg/session/redis_store.go", "redis_store.go.tmpl"),
+            ("pkg/session/redis_hash.go", "redis_hash.go.tmpl"),
+            ("pkg/session/tiered_store.go", "tiered_store.go.tmpl"),
             ("pkg/session/memory_store.go", "memory_store.go.tmpl"),
+            ("pkg/session/eviction.go", "eviction.go.tmpl"),
             ("pkg/session/badger_store.go", "badger_store.go.tmpl"),
-            ("pkg/session/session_manager.go", "session_manager.go.tmpl")
+            ("pkg/session/session_manager.go", "session_manager.go.tmpl"),
+            ("pkg/session/middleware.go", "middleware.go.tmpl")
         ])
+        self._add_shared_packages("badgerx", "idgen")
         
         enhancer.update_config({
             "SessionLevel": "getEnv(\"SESSION_LEVEL\", \"low\")",
             "RedisAddr": "getEnv(\"REDIS_ADDR\", \"localhost:6379\")",
             "RedisPassword": "getEnv(\"REDIS_PASSWORD\", \"\")",
-            "RedisDB": "getEnvAsInt(\"REDIS_DB\", 0)"
+            "RedisDB": "getEnvAsInt(\"REDIS_DB\", 0)",
+            "SessionMaxEntries": "getEnvAsInt(\"SESSION_MAX_ENTRIES\", 0)",
+            "SessionMaxBytes": "getEnvAsInt(\"SESSION_MAX_BYTES\", 0)",
+            "SessionEviction": "getEnv(\"SESSION_EVICTION\", \"lru\")",
+            "SessionNearCacheSize": "getEnvAsInt(\"SESSION_NEAR_CACHE_SIZE\", 10000)",
+            "SessionNearCacheTTL": "getEnvAsAsDuration(\"SESSION_NEAR_CACHE_TTL\", 30*time.Second)",
+            "SessionInvalidation": "getEnv(\"SESSION_INVALIDATION\", \"pubsub\")",
+            "SessionRedisLayout": "getEnv(\"SESSION_REDIS_LAYOUT\", \"json\")",
+            "SessionCookieName": "getEnv(\"SESSION_COOKIE_NAME\", \"session_id\")",
+            "SessionCookieSecure": "getEnvAsBool(\"SESSION_COOKIE_SECURE\", false)",
+            "SessionTTL": "getEnvAsAsDuration(\"SESSION_TTL\", 24*time.Hour)"
         })
         
+        # 会话服务在main中创建，退出时写入剩余的访问时间并关闭存储
+        enhancer.update_main(["pkg/session"], [
+            "if err := sessionService.Close(); err != nil {",
+            "\tlog.Error(\"关闭会话管理失败\", \"error\", err)",
+            "}"
+        ], setup_lines=[
+            "// 会话管理，处理器通过 session.FromContext 获取当前会话",
+            "sessionService, err := session.NewSessionManager(cfg)",
+            "if err != nil {",
+            "\tpanic(\"初始化会话管理失败: \" + err.Error())",
+            "}",
+            "sessionOpts := session.NewMiddlewareOptions(cfg)",
+            "sessionOpts.OnWriteError = func(sessionID string, err error) {",
+            "\tlog.Error(\"写回会话失败\", \"session_id\", sessionID, \"error\", err)",
+            "}",
+            ""
+        ], middlewares=["session.Middleware(sessionService, sessionOpts)"])
+        # Badger存储的指标注册到默认注册表，由 /metrics 端点导出
+        enhancer.add_metrics_route()
+        
         logger.success("✅ 会话管理能力添加完成！")
         self._print_next_steps([
             "go get github.com/redis/go-redis/v9",
-            "go get github.com/dgraph-io/badger/v4"
+            "go get github.com/dgraph-io/badger/v4",
+            "go get github.com/prometheus/client_golang",
+            "go get github.com/gin-gonic/gin"
         ])
     
     def add_saga_management(self):
@@ -323,6 +372,9 @@ class ProjectEnhancer:
             ("pkg/saga/saga_manager.go", "saga_manager.go.tmpl"),
             ("pkg/saga/example_usage.go", "example_usage.go.tmpl")
         ])
+        self._add_shared_packages("badgerx", "idgen")
+        # Badger存储的指标注册到默认注册表，由 /metrics 端点导出
+        enhancer.add_metrics_route()
         
         logger.success("✅ Saga分布式事务管理能力添加完成！")
 
@@ -347,6 +399,14 @@ class ProjectEnhancer:
             "go get github.com/dgraph-io/badger/v4"
         ])
     
+    def _add_shared_packages(self, *names):
+        """添加会话、任务、Saga共用的包（badgerx: Badger调优参数与值日志回收，idgen: ID生成）"""
+        for name in names:
+            ModuleEnhancer(self.project_path, self.project_name, name).add_module(
+                [f"pkg/{name}"],
+                [(f"pkg/{name}/{name}.go", f"{name}.go.tmpl")]
+            )
+    
     def _print_next_steps(self, steps):
         """打印后续步骤"""
         logger.info("🚀 下一步:")
@@ -384,27 +444,96 @@ class ModuleEnhancer:
             logger.warning("⚠️  配置文件不存在，跳过配置更新")
             return
         
-        content = config_file.read_text()
-        
-        # 添加结构体字段
-        struct_end = "\tLogLevel string\n}"
-        if struct_end in content:
-            new_fields = "\tLogLevel string\n\n\t// " + self.module_type.upper() + "配置\n"
-            for field, default in config_fields.items():
-                new_fields += f"\t{field} string\n"
-            content = content.replace(struct_end, new_fields + "}")
-        
-        # 添加Load函数默认值
-        load_end = "\t\tLogLevel:   getEnv(\"LOG_LEVEL\", \"info\"),\n\t}\n\n\treturn config, nil\n}"
-        if load_end in content:
-            new_load = "\t\tLogLevel:   getEnv(\"LOG_LEVEL\", \"info\"),\n"
+        try:
+            content = GoConfigPatcher.add_fields(config_file.read_text(), self.module_type.upper(), config_fields)
+        except ValueError as e:
+            # 缺少配置字段时生成的代码无法编译，列出字段供手工添加
+            logger.error(f"❌ pkg/config/config.go 结构不匹配（{e}），请手工添加{self.module_type}配置字段:")
             for field, default in config_fields.items():
-                new_load += f"\t\t{field}: {default},\n"
-            new_load += "\t}\n\n\treturn config, nil\n}"
-            content = content.replace(load_end, new_load)
+                logger.error(f"    {field} {GoConfigPatcher.field_type(default)} = {default}")
+            return
         
         config_file.write_text(content)
         logger.success(f"✅ {self.module_type}配置已添加到 pkg/config/config.go")
+    
+    def update_main(self, imports: list, shutdown_lines: list, setup_lines: list = None, middlewares: list = None):
+        """更新main.go - 添加导入、设置路由前的初始化代码、路由中间件和退出时的资源释放代码"""
+        main_file = self.project_path / "cmd" / "api" / "main.go"
+        if not main_file.exists():
+            logger.warning("⚠️  main.go不存在，跳过入口更新")
+            return
+        
+        content = main_file.read_text()
+        
+        # 在pkg/http导入后添加模块导入
+        import_anchor = f"\t\"{self.project_name}/pkg/http\"\n"
+        for package in imports:
+            import_line = f"\t\"{self.project_name}/{package}\"\n"
+            if import_line not in content and import_anchor in content:
+                content = content.replace(import_anchor, import_anchor + import_line)
+        
+        # 在设置路由注释前添加初始化代码
+        setup_anchor = "\t// 设置路由\n"
+        setup_code = "".join(f"\t{line}\n" if line else "\n" for line in setup_lines or [])
+        if setup_code and setup_code not in content:
+            if setup_anchor in content:
+                content = content.replace(setup_anchor, setup_code + setup_anchor)
+            else:
+                logger.error(f"❌ main.go中未找到 `// 设置路由`，请手工添加{self.module_type}初始化代码:\n{setup_code}")
+        
+        # 把中间件追加到 SetupRouter 的参数中
+        if middlewares:
+            self._ensure_router_middlewares()
+            call = re.search(r"http\.SetupRouter\(cfg, log([^\n]*)\)\n", content)
+            if call is None:
+                logger.error(f"❌ main.go中未找到 http.SetupRouter 调用，请手工注册中间件: {', '.join(middlewares)}")
+            else:
+                args = call.group(1) + "".join(f", {m}" for m in middlewares if m not in call.group(1))
+                content = content[:call.start(1)] + args + content[call.end(1):]
+        
+        # 在释放资源注释后添加关闭代码
+        shutdown_anchor = "\t// 释放资源\n"
+        shutdown_code = "".join(f"\t{line}\n" for line in shutdown_lines)
+        if shutdown_code not in content and shutdown_anchor in content:
+            content = content.replace(shutdown_anchor, shutdown_anchor + shutdown_code)
+        
+        main_file.write_text(content)
+        logger.success(f"✅ {self.module_type}初始化与关闭逻辑已添加到 cmd/api/main.go")
+
+    def _ensure_router_middlewares(self):
+        """旧版本生成的router.go没有middlewares参数时补上"""
+        router_file = self.project_path / "pkg" / "http" / "router.go"
+        if not router_file.exists():
+            return
+
+        content = router_file.read_text()
+        if "middlewares ...gin.HandlerFunc" in content:
+            return
+
+        signature = "func SetupRouter(cfg *config.Config, log *logger.Logger) *gin.Engine {\n\tr := gin.Default()\n"
+        if signature not in content:
+            logger.error("❌ router.go结构不匹配，请手工为 SetupRouter 添加 middlewares ...gin.HandlerFunc 参数并调用 r.Use(middlewares...)")
+            return
+        content = content.replace(signature, (
+            "func SetupRouter(cfg *config.Config, log *logger.Logger, middlewares ...gin.HandlerFunc) *gin.Engine {\n"
+            "\tr := gin.Default()\n"
+            "\tr.Use(middlewares...)\n"
+        ))
+        router_file.write_text(content)
+
+    def add_metrics_route(self):
+        """在router.go中注册 /metrics 端点，导出 badgerx 等注册到默认注册表的指标"""
+        router_file = self.project_path / "pkg" / "http" / "router.go"
+        if not router_file.exists():
+            logger.warning("⚠️  router.go不存在，跳过 /metrics 端点注册")
+            return
+
+        try:
+            content = GoRouterPatcher.add_metrics_route(router_file.read_text())
+        except ValueError as e:
+            logger.error(f"❌ router.go结构不匹配（{e}），请手工注册 r.GET(\"/metrics\", gin.WrapH(promhttp.Handler()))")
+            return
+        router_file.write_text(content)
 
 
 @cli.command()
@@ -4,10 +4,14 @@
 为项目添加长时处理任务机制和定时任务机制
 """
 
+import logging
 from pathlib import Path
 from typing import Dict, Any, List
 
 from .base_generator import BaseGenerator
+from .utils import GoConfigPatcher, GoRouterPatcher
+
+logger = logging.getLogger(__name__)
 
 
 class TaskGenerator(BaseGenerator):
@@ -30,19 +34,26 @@ class TaskGenerator(BaseGenerator):
         # 生成文件
         self._generate_entity()
         self._generate_store()
+        self._generate_store_test()
         self._generate_redis_store()
         self._generate_badger_store()
+        self._generate_badgerx()
+        self._generate_idgen()
         self._generate_usecase()
         self._generate_manager()
+        self._generate_metrics()
         self._generate_example()
         
         # 更新配置
         self._update_config()
+        self._update_router()
     
     def _create_directories(self) -> None:
         """创建任务相关目录"""
         directories = [
             Path("pkg/task"),
+            Path("pkg/badgerx"),
+            Path("pkg/idgen"),
             Path("internal/usecase/task"),
             Path("internal/entity"),
         ]
@@ -58,6 +69,11 @@ class TaskGenerator(BaseGenerator):
         content = self.render_template("task", "task_store.go.tmpl")
         self.generate_file(Path("pkg/task/task_store.go"), content)
     
+    def _generate_store_test(self) -> None:
+        """生成内存存储的并发测试和基准测试"""
+        content = self.render_template("task", "task_store_test.go.tmpl")
+        self.generate_file(Path("pkg/task/task_store_test.go"), content)
+    
     def _generate_redis_store(self) -> None:
         """生成Redis存储实现"""
         content = self.render_template("task", "redis_store.go.tmpl")
@@ -68,6 +84,16 @@ class TaskGenerator(BaseGenerator):
         content = self.render_template("task", "badger_store.go.tmpl")
         self.generate_file(Path("pkg/task/badger_store.go"), content)
     
+    def _generate_badgerx(self) -> None:
+        """生成Badger共用参数与值日志回收"""
+        content = self.render_template("badgerx", "badgerx.go.tmpl")
+        self.generate_file(Path("pkg/badgerx/badgerx.go"), content)
+    
+    def _generate_idgen(self) -> None:
+        """生成ID生成包"""
+        content = self.render_template("idgen", "idgen.go.tmpl")
+        self.generate_file(Path("pkg/idgen/idgen.go"), content)
+    
     def _generate_usecase(self) -> None:
         """生成任务服务用例"""
         content = self.render_template("task", "usecase_task.go.tmpl")
@@ -78,6 +104,11 @@ class TaskGenerator(BaseGenerator):
         content = self.render_template("task", "task_manager.go.tmpl")
         self.generate_file(Path("pkg/task/task_manager.go"), content)
     
+    def _generate_metrics(self) -> None:
+        """生成任务指标"""
+        content = self.render_template("task", "metrics.go.tmpl")
+        self.generate_file(Path("pkg/task/metrics.go"), content)
+    
     def _generate_example(self) -> None:
         """生成使用示例"""
         content = self.render_template("task", "example_usage.go.tmpl")
@@ -97,55 +128,50 @@ class TaskGenerator(BaseGenerator):
             logger.warning(f"读取配置文件失败: {e}")
             return
         
-        # 添加任务配置
-        task_config = """
-	// 任务配置
-	TaskLevel    string `yaml:"task_level" env:"TASK_LEVEL" env-default:"low"`
-	TaskTimeout  int    `yaml:"task_timeout" env:"TASK_TIMEOUT" env-default:"30"` // 分钟
-	TaskWorkers  int    `yaml:"task_workers" env:"TASK_WORKERS" env-default:"3"`
-	TaskRetries  int    `yaml:"task_retries" env:"TASK_RETRIES" env-default:"3"`
-"""
+        task_fields = {
+            "TaskLevel": "getEnv(\"TASK_LEVEL\", \"low\")",
+            "TaskTimeout": "getEnvAsInt(\"TASK_TIMEOUT\", 30)",
+            "TaskWorkers": "getEnvAsInt(\"TASK_WORKERS\", 3)",
+            "TaskRetries": "getEnvAsInt(\"TASK_RETRIES\", 3)",
+        }
         
-        # 检查是否已存在任务配置
-        if 'TaskLevel' in content:
+        try:
+            content = GoConfigPatcher.add_fields(content, "任务", task_fields)
+        except ValueError as e:
+            # 缺少配置字段时生成的代码无法编译，列出字段供手工添加
+            logger.error(f"配置文件结构不匹配（{e}），请手工添加任务配置字段: {', '.join(task_fields)}")
             return
         
-        # 查找结构体定义结束位置
-        lines = content.split('\n')
-        new_lines = []
-        added = False
+        try:
+            with open(config_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+        except Exception as e:
+            logger.warning(f"更新配置文件失败: {e}")
+    
+    def _update_router(self) -> None:
+        """在路由中注册 /metrics 端点，供 prometheus.yml 抓取"""
+        router_file = self.project_path / "pkg" / "http" / "router.go"
+        if not router_file.exists():
+            return
         
-        for line in lines:
-            new_lines.append(line)
-            
-            # 在结构体最后一个字段后添加任务配置
-            if not added and line.strip().endswith('`') and 'type Config struct' in content:
-                # 找到结构体结束位置
-                brace_count = 0
-                in_struct = False
-                
-                for i, l in enumerate(lines):
-                    if 'type Config struct' in l:
-                        in_struct = True
-                        brace_count = 1
-                    elif in_struct:
-                        if '{' in l:
-                            brace_count += l.count('{')
-                        if '}' in l:
-                            brace_count -= l.count('}')
-                            if brace_count == 0:
-                                # 在结构体结束前添加任务配置
-                                new_lines = lines[:i] + [task_config.strip()] + lines[i:]
-                                added = True
-                                break
+        try:
+            with open(router_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception as e:
+            logger.warning(f"读取路由文件失败: {e}")
+            return
+        
+        try:
+            content = GoRouterPatcher.add_metrics_route(content)
+        except ValueError as e:
+            logger.warning(f"路由文件结构不匹配（{e}），跳过 /metrics 端点注册")
+            return
         
-        if added:
-            new_content = '\n'.join(new_lines)
-            try:
-                with open(config_file, 'w', encoding='utf-8') as f:
-                    f.write(new_content)
-            except Exception as e:
-                logger.warning(f"更新配置文件失败: {e}")
+        try:
+            with open(router_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+        except Exception as e:
+            logger.warning(f"更新路由文件失败: {e}")
     
     def get_instructions(self) -> List[str]:
         """获取使用说明"""
@@ -155,10 +181,14 @@ class TaskGenerator(BaseGenerator):
             "📁 生成的文件:",
             "   • 实体定义: internal/entity/task_data.go",
             "   • 任务存储: pkg/task/task_store.go",
+            "   • 存储测试: pkg/task/task_store_test.go",
             "   • Redis存储: pkg/task/redis_store.go",
             "   • Badger存储: pkg/task/badger_store.go",
+            "   • Badger调优与值日志回收: pkg/badgerx/badgerx.go",
+            "   • ID生成: pkg/idgen/idgen.go",
             "   • 任务服务: internal/usecase/task/usecase_task.go",
             "   • 任务管理器: pkg/task/task_manager.go",
+            "   • 任务指标: pkg/task/metrics.go (/metrics 端点)",
             "   • 使用示例: pkg/task/example_usage.go",
             "",
             "🔧 下一步:",
@@ -166,12 +196,14 @@ class TaskGenerator(BaseGenerator):
             "      go get github.com/redis/go-redis/v9",
             "      go get github.com/dgraph-io/badger/v4",
             "      go get github.com/robfig/cron/v3",
+            "      go get github.com/prometheus/client_golang",
             "",
             "   2. 配置任务存储:",
             "      设置环境变量 TASK_LEVEL=low|normal|high",
             "      TASK_LEVEL=low (内存存储) - 开发/测试环境",
             "      TASK_LEVEL=normal (Badger存储) - 中小型项目",
             "      TASK_LEVEL=high (Redis存储) - 大型项目",
+            "      TASK_WORKERS=3 (工作协程数，任务到达时立即唤醒)",
             "",
             "   3. 使用任务管理器:",
             "      查看 pkg/task/example_usage.go 了解使用方法",
@@ -185,5 +217,9 @@ class TaskGenerator(BaseGenerator):
             "",
             "   5. 定时任务配置:",
             "      使用 cron 表达式设置定时任务",
-            "      例如: '0 2 * * *' 每天凌晨2点执行"
+            "      例如: '0 2 * * *' 每天凌晨2点执行",
+            "",
+            "   6. 运行存储并发测试和基准测试:",
+            "      go test -race ./pkg/task/",
+            "      go test -run XXX -bench . ./pkg/task/"
         ]
\ No newline at end of file
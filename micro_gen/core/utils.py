@@ -204,6 +204,98 @@ class CodeGenerator:
             raise
 
 
+class GoConfigPatcher:
+    """向生成的 pkg/config/config.go 追加配置字段
+
+    以 Config 结构体和 Load 中 &Config{...} 字面量的右花括号为锚点，
+    多个模块先后追加时锚点始终存在
+    """
+
+    STRUCT_START = "type Config struct {"
+    LOAD_START = "config := &Config{"
+
+    @staticmethod
+    def field_type(default: str) -> str:
+        """根据默认值表达式推断配置字段类型"""
+        if default.startswith("getEnvAsInt("):
+            return "int"
+        if default.startswith("getEnvAsBool("):
+            return "bool"
+        if default.startswith("getEnvAsAsDuration("):
+            return "time.Duration"
+        return "string"
+
+    @staticmethod
+    def _block_end(content: str, start: str, end: str) -> int:
+        """返回start之后第一个end的位置，找不到时抛出ValueError"""
+        begin = content.find(start)
+        if begin < 0:
+            raise ValueError(f"未找到 `{start}`")
+        pos = content.find(end, begin)
+        if pos < 0:
+            raise ValueError(f"未找到 `{start}` 的结束位置")
+        return pos
+
+    @classmethod
+    def add_fields(cls, content: str, section: str, fields: Dict[str, str]) -> str:
+        """追加字段声明和Load默认值，fields为字段名到默认值表达式的映射，已存在的字段跳过
+
+        config.go结构不匹配时抛出ValueError
+        """
+        struct_end = cls._block_end(content, cls.STRUCT_START, "\n}\n")
+        struct_block = content[:struct_end]
+        missing = {
+            field: default for field, default in fields.items()
+            if not re.search(rf"^\t{re.escape(field)}\s", struct_block[struct_block.find(cls.STRUCT_START):], re.M)
+        }
+        if not missing:
+            return content
+
+        # 先确认两个锚点都存在，避免只写入一半
+        cls._block_end(content, cls.LOAD_START, "\n\t}\n")
+
+        decl = f"\n\t// {section}配置\n"
+        for field, default in missing.items():
+            decl += f"\t{field} {cls.field_type(default)}\n"
+        content = content[:struct_end] + "\n" + decl.rstrip("\n") + content[struct_end:]
+
+        load_end = cls._block_end(content, cls.LOAD_START, "\n\t}\n")
+        values = "".join(f"\t\t{field}: {default},\n" for field, default in missing.items())
+        return content[:load_end + 1] + values + content[load_end + 1:]
+
+
+class GoRouterPatcher:
+    """向生成的 pkg/http/router.go 注册 /metrics 端点
+
+    以 gin 导入行和 /ready 路由为锚点，多个模块先后注册时只添加一次
+    """
+
+    IMPORT_ANCHOR = "\t\"github.com/gin-gonic/gin\"\n"
+    ROUTE_ANCHOR = "\tr.GET(\"/ready\", healthHandler.ReadinessCheck)\n"
+
+    @classmethod
+    def add_metrics_route(cls, content: str) -> str:
+        """注册Prometheus指标端点，已注册时原样返回
+
+        router.go结构不匹配时抛出ValueError
+        """
+        if '/metrics' in content:
+            return content
+        if cls.IMPORT_ANCHOR not in content:
+            raise ValueError("未找到 gin 导入")
+        if cls.ROUTE_ANCHOR not in content:
+            raise ValueError("未找到 /ready 路由")
+
+        metrics_import = "\t\"github.com/prometheus/client_golang/prometheus/promhttp\"\n"
+        metrics_route = (
+            "\t\n"
+            "\t// Prometheus 指标端点\n"
+            "\tr.GET(\"/metrics\", gin.WrapH(promhttp.Handler()))\n"
+        )
+        content = content.replace(cls.IMPORT_ANCHOR, cls.IMPORT_ANCHOR + metrics_import, 1)
+        return content.replace(cls.ROUTE_ANCHOR, cls.ROUTE_ANCHOR + metrics_route, 1)
+
+
 class ValidationUtils:
     """验证工具类"""
     